@@ -1,7 +1,19 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class PageLimitPagination(PageNumberPagination):
     """Пагинация по количеству элементов на странице."""
     page_size_query_param = 'limit'
     page_size = 6
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация рецептов.
+
+    Страница выбирается условием по индексированному полю,
+    а не через OFFSET, поэтому время ответа не зависит от глубины.
+    """
+    page_size_query_param = 'limit'
+    page_size = 6
+    ordering = ('-pub_date', '-id')
@@ -15,5 +15,5 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
         """Проверяет разрешение на выполнение действия над объектом."""
         return (
             request.method in permissions.SAFE_METHODS
-            or obj.author == request.user
+            or obj.author_id == request.user.id
         )
@@ -1,7 +1,13 @@
-from django.db import transaction
+from collections import OrderedDict
+from copy import deepcopy
+
+from django.db import models, transaction
+from django.db.models import (
+    Count, Exists, OuterRef, Prefetch, Subquery, Value
+)
+from django.utils.functional import cached_property
 from rest_framework.exceptions import ValidationError
 from rest_framework import serializers
-from rest_framework.fields import SerializerMethodField
 from drf_extra_fields.fields import Base64ImageField
 from djoser.serializers import UserCreateSerializer, UserSerializer
 
@@ -18,15 +24,62 @@ from recipes.models import (
     Follow
 )
 
+FALSE_VALUE = Value(False, output_field=models.BooleanField())
+
+
+def has_duplicates(items):
+    """Проверяет наличие повторов, останавливаясь на первом из них."""
+    seen = set()
+    add = seen.add
+    return any(item in seen or add(item) for item in items)
+
+
+class CachedFieldsMixin:
+    """
+    Кэширует поля сериализатора на уровне класса.
+
+    Построение полей по модели выполняется один раз на класс,
+    каждый экземпляр получает собственные копии полей.
+    """
+    _fields_cache = {}
+
+    def get_fields(self):
+        """Возвращает копии закэшированных полей сериализатора."""
+        cls = type(self)
+        cached = self._fields_cache.get(cls)
+        if cached is None:
+            cached = super().get_fields()
+            self._fields_cache[cls] = cached
+        return OrderedDict(
+            (name, deepcopy(field)) for name, field in cached.items()
+        )
+
+    @cached_property
+    def _writable_fields(self):
+        """Поля для записи, вычисляются один раз на экземпляр."""
+        return tuple(
+            field for field in self.fields.values() if not field.read_only
+        )
+
+    @cached_property
+    def _readable_fields(self):
+        """
+        Поля для чтения, вычисляются один раз на экземпляр,
+        а не для каждого объекта при сериализации списка.
+        """
+        return tuple(
+            field for field in self.fields.values() if not field.write_only
+        )
+
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для тегов."""
     class Meta:
         model = Tag
         fields = ('id', 'name', 'color', 'slug')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для ингредиентов."""
     class Meta:
         model = Ingredient
@@ -38,6 +91,7 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
     class Meta:
         model = ShoppingCart
         fields = ('user', 'recipe')
+        read_only_fields = fields
 
     def to_representation(self, instance):
         context = {'request': self.context.get('request')}
@@ -49,13 +103,17 @@ class FavoriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Favorite
         fields = ('user', 'recipe')
+        read_only_fields = fields
 
     def to_representation(self, instance):
         context = {'request': self.context.get('request')}
         return RecipeShortSerializer(instance.recipe, context=context).data
 
 
-class RecipeIngredientSerializer(serializers.ModelSerializer):
+class RecipeIngredientSerializer(
+    CachedFieldsMixin,
+    serializers.ModelSerializer
+):
     """Сериализатор для ингредиентов рецепта."""
     id = serializers.ReadOnlyField(source='ingredient.id')
     name = serializers.ReadOnlyField(source='ingredient.name')
@@ -67,7 +125,10 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
+class RecipeIngredientCreateSerializer(
+    CachedFieldsMixin,
+    serializers.ModelSerializer
+):
     """Сериализатор для создания ингредиентов рецепта."""
     id = serializers.IntegerField(write_only=True)
     amount = serializers.IntegerField(min_value=MIN_VALUE, max_value=MAX_VALUE)
@@ -77,19 +138,9 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(CachedFieldsMixin, UserSerializer):
     """Пользовательский сериализатор пользователей."""
-    is_subscribed = SerializerMethodField(required=False)
-
-    def get_is_subscribed(self, obj):
-        """
-        Получение информации о том,
-        подписан ли текущий пользователь на данного пользователя.
-        """
-        request = self.context['request']
-        if request.user.is_authenticated:
-            return obj.following.filter(user=request.user).exists()
-        return False
+    is_subscribed = serializers.BooleanField(read_only=True, default=False)
 
     class Meta:
         model = User
@@ -98,6 +149,22 @@ class CustomUserSerializer(UserSerializer):
             'first_name', 'last_name', 'is_subscribed'
         )
 
+    @classmethod
+    def setup_eager_loading(cls, queryset, user):
+        """
+        Аннотирует пользователей признаком подписки на них.
+        Для анонимного пользователя признак — константа False,
+        и сериализатору не приходится подставлять значение по умолчанию
+        для каждой строки.
+        """
+        if not user.is_authenticated:
+            return queryset.annotate(is_subscribed=FALSE_VALUE)
+        return queryset.annotate(
+            is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('pk'))
+            )
+        )
+
 
 class CustomUserCreateSerializer(UserCreateSerializer):
     """Сериализатор создания пользователей."""
@@ -110,35 +177,23 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         )
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
-    """Сериализатор для подписок."""
+class RecipeShortSerializer(CachedFieldsMixin, serializers.ModelSerializer):
+    """Краткий сериализатор рецептов."""
     class Meta:
-        model = Follow
-        fields = ('user', 'author')
-
-    def validate(self, value):
-        """
-        Проверка, что пользователь не подписывается на самого себя.
-        """
-        if value['author'] == value['user']:
-            raise serializers.ValidationError(
-                {'errors': 'Вы не можете подписаться на самого себя!'}
-            )
-        return value
-
-    def to_representation(self, instance):
-        """
-        Преобразование объекта подписки в его сериализованное представление.
-        """
-        return SubscriptionReadSerializer(instance['author'], context={
-            'request': self.context.get('request')
-        }).data
+        model = Recipe
+        # Querysets для этого сериализатора ограничиваются
+        # этими полями через .only(), остальные поля не читаются.
+        fields = ('id', 'name', 'image', 'cooking_time')
 
 
 class SubscriptionReadSerializer(CustomUserSerializer):
     """Сериализатор для чтения подписок."""
-    recipes_count = serializers.SerializerMethodField()
-    recipes = SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
+    recipes = RecipeShortSerializer(
+        source='limited_recipes',
+        many=True,
+        read_only=True
+    )
 
     class Meta:
         model = User
@@ -148,31 +203,32 @@ class SubscriptionReadSerializer(CustomUserSerializer):
             'recipes_count'
         )
 
-    def get_recipes_count(self, obj):
-        """Получение количества рецептов пользователя."""
-        return obj.recipes.count()
-
-    def get_recipes(self, obj):
-        """Получение списка рецептов пользователя с учетом ограничения."""
-        request = self.context['request']
-        limit = request.GET[
-            'recipes_limit'
-        ] if 'recipes_limit' in request.GET else None
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[: int(limit)]
-        serializer = RecipeShortSerializer(recipes, many=True, read_only=True)
-        return serializer.data
-
-
-class RecipeShortSerializer(serializers.ModelSerializer):
-    """Краткий сериализатор рецептов."""
-    class Meta:
-        model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+    @classmethod
+    def setup_eager_loading(cls, queryset, user, recipes_limit=None):
+        """
+        Подгружает рецепты авторов одним запросом
+        с учетом ограничения их количества на автора
+        и аннотирует авторов количеством рецептов.
+        """
+        recipes = Recipe.objects.only(
+            *RecipeShortSerializer.Meta.fields, 'author'
+        )
+        if recipes_limit:
+            recipes = recipes.filter(
+                pk__in=Subquery(
+                    Recipe.objects.filter(
+                        author=OuterRef('author')
+                    ).values('pk')[:int(recipes_limit)]
+                )
+            )
+        return super().setup_eager_loading(queryset, user).annotate(
+            recipes_count=Count('recipes')
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+        )
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для чтения рецептов."""
     author = CustomUserSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
@@ -181,32 +237,58 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         many=True
     )
     image = Base64ImageField(read_only=True)
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
+    is_favorited = serializers.BooleanField(read_only=True, default=False)
+    is_in_shopping_cart = serializers.BooleanField(
+        read_only=True,
+        default=False
+    )
 
     class Meta:
         model = Recipe
-        fields = [
+        fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
             'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time',
-        ]
-
-    def get_is_favorited(self, obj):
-        """Получение информации о том, добавлен ли рецепт в избранное."""
-        request = self.context['request']
-        if request.user.is_authenticated:
-            return obj.favorites.filter(user=request.user).exists()
-        return False
+        )
 
-    def get_is_in_shopping_cart(self, obj):
-        """Получение информации о том, добавлен ли рецепт в список покупок."""
-        request = self.context['request']
-        if request.user.is_authenticated:
-            return obj.shopping_cart.filter(user=request.user).exists()
-        return False
+    @classmethod
+    def setup_eager_loading(cls, queryset, user):
+        """
+        Подгружает связанные объекты и аннотирует рецепты
+        признаками избранного и списка покупок.
+        Должен вызываться вьюсетом при формировании queryset.
+        """
+        queryset = queryset.prefetch_related(
+            Prefetch(
+                'author',
+                queryset=CustomUserSerializer.setup_eager_loading(
+                    User.objects.only(
+                        'id', 'email', 'username', 'first_name', 'last_name'
+                    ),
+                    user
+                )
+            ),
+            'tags',
+            Prefetch(
+                'recipes_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=FALSE_VALUE,
+                is_in_shopping_cart=FALSE_VALUE
+            )
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            )
+        )
 
 
-class RecipeWriteSerializer(serializers.ModelSerializer):
+class RecipeWriteSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для создания и обновления рецептов."""
     author = CustomUserSerializer(read_only=True)
     tags = serializers.PrimaryKeyRelatedField(
@@ -218,66 +300,128 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         min_value=MIN_VALUE,
         max_value=MAX_VALUE
     )
-    image = Base64ImageField()
+    image = Base64ImageField(
+        required=True,
+        allow_null=False,
+        allow_empty_file=False
+    )
 
     class Meta:
         model = Recipe
-        fields = [
+        fields = (
             'id', 'tags', 'author', 'ingredients',
             'name', 'image', 'text', 'cooking_time'
-        ]
+        )
 
-    def get_ingredient_or_raise_400(self, ingredient_id):
-        """Получение ингредиента или вызов ошибки 400."""
-        try:
-            return Ingredient.objects.get(pk=ingredient_id)
-        except Ingredient.DoesNotExist:
+    def check_ingredients_exist(self, ingredients_data):
+        """Проверка существования ингредиентов одним запросом."""
+        ingredient_ids = [
+            ingredient_data['id'] for ingredient_data in ingredients_data
+        ]
+        existing_ids = set(
+            Ingredient.objects.filter(
+                pk__in=ingredient_ids
+            ).values_list('pk', flat=True)
+        )
+        missing_ids = [
+            ingredient_id for ingredient_id in ingredient_ids
+            if ingredient_id not in existing_ids
+        ]
+        if missing_ids:
             raise ValidationError(
-                f'Ингредиент с идентификатором {ingredient_id} не существует.',
+                'Ингредиенты с идентификаторами '
+                f'{", ".join(map(str, missing_ids))} не существуют.',
                 code='invalid'
             )
 
-    def process_ingredients_data(self, instance, ingredients_data):
-        """Обработка данных об ингредиентах."""
-        ingredients_to_create = []
-        for ingredient_data in ingredients_data:
-            ingredient_id = ingredient_data.get('id')
-            ingredient = self.get_ingredient_or_raise_400(ingredient_id)
-            ingredients_to_create.append(
-                RecipeIngredient(
-                    recipe=instance,
-                    ingredient=ingredient,
-                    amount=ingredient_data['amount']
-                )
+    def process_ingredients_data(
+        self, instance, ingredients_data, replace=False
+    ):
+        """
+        Обработка данных об ингредиентах.
+        При replace=True ингредиенты рецепта сверяются с переданными:
+        лишние удаляются, у совпадающих обновляется количество,
+        создаются только новые.
+        """
+        existing = {}
+        if replace:
+            existing = {
+                recipe_ingredient.ingredient_id: recipe_ingredient
+                for recipe_ingredient in instance.recipes_ingredients.all()
+            }
+        amounts = {
+            ingredient_data['id']: ingredient_data['amount']
+            for ingredient_data in ingredients_data
+        }
+        removed = [
+            recipe_ingredient.pk
+            for ingredient_id, recipe_ingredient in existing.items()
+            if ingredient_id not in amounts
+        ]
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        changed = []
+        for ingredient_id, recipe_ingredient in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        RecipeIngredient.bulk_attach(
+            instance,
+            (
+                (ingredient_id, amount)
+                for ingredient_id, amount in amounts.items()
+                if ingredient_id not in existing
             )
-        RecipeIngredient.objects.bulk_create(ingredients_to_create)
+        )
 
     def create(self, validated_data):
-        """Создание нового рецепта."""
+        """
+        Создание нового рецепта.
+        Ингредиенты проверяются до начала транзакции,
+        в транзакции выполняются только записи.
+        """
         ingredients_data = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
         user = self.context['request'].user
-        with transaction.atomic():
+        self.check_ingredients_exist(ingredients_data)
+        with transaction.atomic(savepoint=False):
             recipe = Recipe.objects.create(author=user, **validated_data)
             recipe.tags.set(tags_data)
             self.process_ingredients_data(recipe, ingredients_data)
         return recipe
 
     def update(self, instance, validated_data):
-        """Редактирование рецепта."""
+        """
+        Редактирование рецепта.
+        Ингредиенты проверяются до начала транзакции,
+        в транзакции выполняются только записи.
+        """
         ingredients_data = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
-        with transaction.atomic():
-            instance.recipes_ingredients.all().delete()
+        self.check_ingredients_exist(ingredients_data)
+        with transaction.atomic(savepoint=False):
             instance.tags.set(tags_data)
-            self.process_ingredients_data(instance, ingredients_data)
-        return super().update(instance, validated_data)
+            self.process_ingredients_data(
+                instance, ingredients_data, replace=True
+            )
+            return super().update(instance, validated_data)
 
     def to_representation(self, instance):
-        """Представление рецепта."""
+        """
+        Представление рецепта.
+        Рецепт перечитывается одним запросом с подгрузкой связанных
+        объектов, чтобы сериализатор чтения не обращался к БД построчно.
+        """
+        request = self.context.get('request')
+        instance = RecipeReadSerializer.setup_eager_loading(
+            Recipe.objects.all(),
+            request.user
+        ).get(pk=instance.pk)
         return RecipeReadSerializer(
             instance,
-            context={'request': self.context.get('request')}
+            context={'request': request}
         ).data
 
     def validate(self, attrs):
@@ -288,9 +432,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise ValidationError(
                 {'ingredients': 'Обязательное поле!'}
             )
-        if len(set(
-            ingredient['id'] for ingredient in ingredients
-        )) != len(ingredients):
+        if has_duplicates(ingredient['id'] for ingredient in ingredients):
             raise ValidationError(
                 {'ingredients': 'Ингредиенты должны быть уникальными!'}
             )
@@ -298,7 +440,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise ValidationError(
                 {'tags': 'Обязательное поле!'}
             )
-        if len(set(tags)) != len(tags):
+        if has_duplicates(tags):
             raise ValidationError(
                 {'tags': 'Теги должны быть уникальными!'}
             )
@@ -306,6 +448,11 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         return attrs
 
     def validate_image(self, value):
+        """
+        Проверка изображения.
+        Base64ImageField превращает пустую строку в None до валидаторов,
+        поэтому allow_null этот случай не покрывает.
+        """
         if not value:
             raise serializers.ValidationError(
                 {'image': 'Обязательное поле!'}
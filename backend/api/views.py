@@ -1,6 +1,12 @@
+from urllib.parse import quote
+
+from django.db import IntegrityError
 from django.db.models import Sum
 from django_filters.rest_framework import DjangoFilterBackend
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_page
+from django.views.decorators.vary import vary_on_headers
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
@@ -10,7 +16,7 @@ from rest_framework.permissions import SAFE_METHODS, IsAuthenticated, AllowAny
 from rest_framework.response import Response
 
 from .filters import IngredientFilter, RecipeFilter
-from .paginations import PageLimitPagination
+from .paginations import PageLimitPagination, RecipeCursorPagination
 from .permissions import IsAuthorOrReadOnly
 from .serializers import (
     CustomUserSerializer,
@@ -18,7 +24,6 @@ from .serializers import (
     IngredientSerializer,
     FavoriteSerializer,
     ShoppingCartSerializer,
-    SubscriptionSerializer,
     SubscriptionReadSerializer,
     RecipeReadSerializer,
     RecipeWriteSerializer
@@ -34,7 +39,11 @@ from recipes.models import (
 )
 from users.models import User
 
+REFERENCE_CACHE_TIMEOUT = 60 * 15
+
 
+@method_decorator(cache_page(REFERENCE_CACHE_TIMEOUT), name='list')
+@method_decorator(vary_on_headers('Accept-Language'), name='list')
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     """Представление для работы с тегами."""
     queryset = Tag.objects.all()
@@ -43,9 +52,11 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
 
 
+@method_decorator(cache_page(REFERENCE_CACHE_TIMEOUT), name='list')
+@method_decorator(vary_on_headers('Accept-Language'), name='list')
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     """Представление для работы с ингредиентами."""
-    queryset = Ingredient.objects.all()
+    queryset = Ingredient.objects.order_by('name')
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     filter_backends = [DjangoFilterBackend]
@@ -55,9 +66,22 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
 
 class CustomUserViewSet(UserViewSet):
     """Представление для пользователей."""
-    queryset = User.objects.all().order_by('id')
+    queryset = User.objects.all()
     pagination_class = PageLimitPagination
 
+    def get_queryset(self):
+        """
+        Возвращает пользователей с признаком подписки.
+        Сортировка нужна только для постраничного списка.
+        """
+        queryset = CustomUserSerializer.setup_eager_loading(
+            super().get_queryset(),
+            self.request.user
+        )
+        if self.action == 'list':
+            return queryset.order_by('id')
+        return queryset
+
     def get_serializer_class(self):
         """
         Возвращает класс сериализатора в зависимости от метода запроса.
@@ -72,7 +96,7 @@ class CustomUserViewSet(UserViewSet):
         Возвращает список прав доступа в зависимости от выполняемого действия.
         """
         if self.action in [
-            'subscribe', 'subscriptions', 'destroy', 'me'
+            'subscribe', 'delete_subscribe', 'subscriptions', 'destroy', 'me'
         ]:
             return [IsAuthenticated()]
         return [AllowAny()]
@@ -84,28 +108,44 @@ class CustomUserViewSet(UserViewSet):
     def subscribe(self, request, id):
         """Подписка на пользователя."""
         user = request.user
-        author = get_object_or_404(User, id=id)
-        if user.follower.filter(author=author).exists():
+        if str(user.id) == str(id):
+            raise ValidationError(
+                {'errors': 'Вы не можете подписаться на самого себя!'}
+            )
+        try:
+            _, created = Follow.objects.get_or_create(
+                user_id=user.id,
+                author_id=id
+            )
+        except IntegrityError:
+            # Автор существует, значит сработало ограничение
+            # can_not_follow_yourself (например, для id вида '01').
+            get_object_or_404(User, id=id)
+            raise ValidationError(
+                {'errors': 'Вы не можете подписаться на самого себя!'}
+            )
+        if not created:
             raise ValidationError("Вы уже подписаны на этого автора")
-        serializer = SubscriptionSerializer(
-            data={'user': user.id, 'author': author.id},
+        serializer = SubscriptionReadSerializer(
+            SubscriptionReadSerializer.setup_eager_loading(
+                User.objects.all(),
+                user,
+                request.query_params.get('recipes_limit')
+            ).get(pk=id),
             context={'request': request}
         )
-        serializer.is_valid(raise_exception=True)
-        Follow.objects.create(user=user, author=author)
         return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
     def delete_subscribe(self, request, id):
         """Удаление подписки на пользователя."""
-        if not request.user.is_authenticated:
-            return Response(status=status.HTTP_401_UNAUTHORIZED)
-        user = request.user
-        author = get_object_or_404(User, id=id)
-        if not user.follower.filter(author=author).exists():
+        deleted, _ = Follow.objects.filter(
+            user_id=request.user.id,
+            author_id=id
+        ).delete()
+        if not deleted:
+            get_object_or_404(User, id=id)
             raise ValidationError("Подписка не найдена")
-        subscription = get_object_or_404(Follow, user=user, author=author)
-        subscription.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -115,10 +155,10 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         """Список подписок текущего пользователя."""
-        if not request.user.is_authenticated:
-            return Response(status=status.HTTP_401_UNAUTHORIZED)
-        queryset = User.objects.filter(
-            following__user=request.user
+        queryset = SubscriptionReadSerializer.setup_eager_loading(
+            User.objects.filter(following__user=request.user),
+            request.user,
+            request.query_params.get('recipes_limit')
         ).order_by('id')
         pages = self.paginate_queryset(queryset)
         serializer = SubscriptionReadSerializer(
@@ -128,12 +168,37 @@ class CustomUserViewSet(UserViewSet):
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """Вьюсет для рецептов."""
-    queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     pagination_class = PageLimitPagination
 
+    @property
+    def paginator(self):
+        """
+        Курсорная пагинация для клиентов, передающих cursor
+        (первая страница запрашивается с пустым cursor=),
+        постраничная — для остальных.
+        """
+        if not hasattr(self, '_paginator'):
+            if 'cursor' in self.request.query_params:
+                self._paginator = RecipeCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        """
+        Возвращает рецепты с подгруженными связанными объектами.
+        При удалении связанные объекты не нужны.
+        """
+        if self.action == 'destroy':
+            return Recipe.objects.all()
+        return RecipeReadSerializer.setup_eager_loading(
+            Recipe.objects.all(),
+            self.request.user
+        )
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeReadSerializer
@@ -145,38 +210,34 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def favorite(self, request, pk):
         """Добавление рецепта в избранное."""
-        user = request.user
         try:
-            recipe = Recipe.objects.get(pk=pk)
-        except Recipe.DoesNotExist:
+            favorite, created = Favorite.objects.get_or_create(
+                user_id=request.user.id,
+                recipe_id=pk
+            )
+        except IntegrityError:
             raise ValidationError(
-                'Рецепт не найден в избранном!',
+                'Рецепт не найден!',
                 code=status.HTTP_400_BAD_REQUEST
             )
-        if user.favorites.filter(recipe=recipe).exists():
+        if not created:
             raise ValidationError('Рецепт уже добавлен в избранное!')
         serializer = FavoriteSerializer(
-            data={'user': user.pk, 'recipe': recipe.pk},
+            favorite,
             context={'request': request}
         )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
         return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
     @favorite.mapping.delete
     def delete_favorite(self, request, pk):
         """Удаление рецепта из избранного."""
-        if not request.user.is_authenticated:
-            return Response(status=status.HTTP_401_UNAUTHORIZED)
-        recipe = get_object_or_404(Recipe, id=pk)
-        if not request.user.favorites.filter(recipe=recipe).exists():
+        deleted, _ = Favorite.objects.filter(
+            user_id=request.user.id,
+            recipe_id=pk
+        ).delete()
+        if not deleted:
+            get_object_or_404(Recipe, pk=pk)
             raise ValidationError('Рецепта нет в избранном!')
-        deleted_favorites = get_object_or_404(
-            Favorite,
-            user=request.user,
-            recipe=recipe
-        )
-        deleted_favorites.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -186,38 +247,34 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def shopping_cart(self, request, pk):
         """Добавление рецепта в список покупок."""
-        user = request.user
         try:
-            recipe = Recipe.objects.get(pk=pk)
-        except Recipe.DoesNotExist:
+            cart_item, created = ShoppingCart.objects.get_or_create(
+                user_id=request.user.id,
+                recipe_id=pk
+            )
+        except IntegrityError:
             raise ValidationError(
-                "Рецепт не найден в списоке покупок!",
+                'Рецепт не найден!',
                 code=status.HTTP_400_BAD_REQUEST
             )
-        if user.shopping_cart.filter(recipe=recipe).exists():
-            raise ValidationError("Рецепт уже добавлен в списоке покупок!")
+        if not created:
+            raise ValidationError('Рецепт уже добавлен в списоке покупок!')
         serializer = ShoppingCartSerializer(
-            data={'user': user.pk, 'recipe': recipe.pk},
+            cart_item,
             context={'request': request}
         )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
         return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk):
         """Удаление рецепта из списка покупок."""
-        if not request.user.is_authenticated:
-            return Response(status=status.HTTP_401_UNAUTHORIZED)
-        recipe = get_object_or_404(Recipe, id=pk)
-        if not request.user.shopping_cart.filter(recipe=recipe).exists():
+        deleted, _ = ShoppingCart.objects.filter(
+            user_id=request.user.id,
+            recipe_id=pk
+        ).delete()
+        if not deleted:
+            get_object_or_404(Recipe, pk=pk)
             raise ValidationError('Рецепта нет в списке покупок!')
-        deleted_cart_item = get_object_or_404(
-            ShoppingCart,
-            user=request.user,
-            recipe=recipe
-        )
-        deleted_cart_item.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, permission_classes=(IsAuthenticated,))
@@ -229,14 +286,22 @@ class RecipeViewSet(viewsets.ModelViewSet):
             'ingredient__name',
             'ingredient__measurement_unit'
         ).annotate(amount=Sum('amount'))
-        shopping_list = 'Список покупок:\n'
-        for ingredient in ingredients:
-            shopping_list += (
-                f"{ingredient['ingredient__name']} "
-                f"({ingredient['ingredient__measurement_unit']}) - "
-                f"{ingredient['amount']}\n"
-            )
+
+        def shopping_list():
+            yield 'Список покупок:\n'
+            for ingredient in ingredients.iterator(chunk_size=2000):
+                yield (
+                    f"{ingredient['ingredient__name']} "
+                    f"({ingredient['ingredient__measurement_unit']}) - "
+                    f"{ingredient['amount']}\n"
+                )
+
         file_name = 'список_покупок.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        response['Content-Disposition'] = f"attachment; filename='{file_name}'"
+        response = StreamingHttpResponse(
+            shopping_list(),
+            content_type='text/plain; charset=utf-8'
+        )
+        response['Content-Disposition'] = (
+            f"attachment; filename*=UTF-8''{quote(file_name)}"
+        )
         return response
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db.models import Count
 
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag, Follow)
@@ -10,6 +11,8 @@ class IngredientAdmin(admin.ModelAdmin):
     """Администратор модели Ингредиент."""
     list_display = ('id', 'name', 'measurement_unit',)
     list_filter = ('name', )
+    search_fields = ('name',)
+    ordering = ('name',)
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -21,6 +24,8 @@ class TagAdmin(admin.ModelAdmin):
 class RecipeIngredientAdmin(admin.ModelAdmin):
     """Администратор модели Ингредиент рецепта."""
     list_display = ('ingredient', 'amount', 'recipe',)
+    list_select_related = ('ingredient', 'recipe',)
+    autocomplete_fields = ('ingredient', 'recipe',)
     search_fields = ('recipe__name', 'ingredient__name',)
     list_filter = ('ingredient__name',)
 
@@ -29,34 +34,48 @@ class RecipeIngredientInline(admin.TabularInline):
     """Встраиваемый администратор модели Ингредиент рецепта."""
     model = RecipeIngredient
     min_num = MIN_RECIPE_ADMIN
+    autocomplete_fields = ('ingredient',)
 
 
 class RecipeAdmin(admin.ModelAdmin):
     """Администратор модели Рецепт."""
     list_display = ('name', 'author', 'in_favorites',)
     readonly_fields = ('in_favorites',)
-    list_filter = ('author', 'name', 'tags',)
+    list_filter = ('tags', 'pub_date',)
+    search_fields = ('name', 'author__username', 'author__email',)
+    autocomplete_fields = ('author',)
+    list_per_page = 25
     inlines = [RecipeIngredientInline]
 
+    def get_queryset(self, request):
+        """Аннотирует рецепты количеством добавлений в избранное."""
+        return super().get_queryset(request).annotate(
+            _in_favorites=Count('favorites')
+        )
+
     def in_favorites(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj._in_favorites
 
     in_favorites.short_description = 'Добавлений в избранное'
+    in_favorites.admin_order_field = '_in_favorites'
 
 
 class ShoppingCartAdmin(admin.ModelAdmin):
     """Администратор модели Список покупок."""
     list_display = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe',)
 
 
 class FavoriteAdmin(admin.ModelAdmin):
     """Администратор модели Избранное."""
     list_display = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe',)
 
 
 class FollowAdmin(admin.ModelAdmin):
     """Администратор модели Подписка на автора."""
     list_display = ('user', 'author',)
+    list_select_related = ('user', 'author',)
 
 
 admin.site.register(Favorite, FavoriteAdmin)
@@ -2,3 +2,4 @@ MAX_LENGTH_NAME = 200
 MAX_LENGTH_COLOR = 7
 MAX_VALUE = 32000
 MIN_VALUE = 1
+BULK_CREATE_BATCH_SIZE = 500
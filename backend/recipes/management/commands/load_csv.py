@@ -12,21 +12,26 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         file_path = os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv')
+        existing = set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
         ingredients_to_create = []
-        with open(file_path, 'r', encoding='utf-8') as file:
+        with open(file_path, 'r', newline='', encoding='utf-8') as file:
             reader = csv.reader(file)
-            for row in reader:
-                name, measurement_unit = row
-                if not Ingredient.objects.filter(
-                    name=name,
-                    measurement_unit=measurement_unit
-                ).exists():
-                    ingredient = Ingredient(
-                        name=name,
-                        measurement_unit=measurement_unit
+            for name, measurement_unit in reader:
+                if (name, measurement_unit) not in existing:
+                    ingredients_to_create.append(
+                        Ingredient(
+                            name=name,
+                            measurement_unit=measurement_unit
+                        )
                     )
-                    ingredients_to_create.append(ingredient)
+                    existing.add((name, measurement_unit))
 
-        Ingredient.objects.bulk_create(ingredients_to_create)
+        Ingredient.objects.bulk_create(
+            ingredients_to_create,
+            batch_size=1000,
+            ignore_conflicts=True
+        )
         self.stdout.write(
             self.style.SUCCESS('Ингредиенты успешно добавлены в БД'))
@@ -6,7 +6,8 @@ from recipes.constans import (
     MAX_LENGTH_NAME,
     MAX_LENGTH_COLOR,
     MIN_VALUE,
-    MAX_VALUE
+    MAX_VALUE,
+    BULK_CREATE_BATCH_SIZE
 )
 from users.models import User
 
@@ -53,13 +54,21 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
-        ordering = ('name',)
         constraints = [
             models.UniqueConstraint(
                 fields=['name', 'measurement_unit'],
                 name='unique_name_measurement_unit'
             ),
         ]
+        # Поиск по началу названия (LIKE 'prefix%') использует индекс
+        # только с классом операторов varchar_pattern_ops.
+        indexes = [
+            models.Index(
+                fields=('name',),
+                name='ingredient_name_pattern_idx',
+                opclasses=('varchar_pattern_ops',),
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -90,6 +99,10 @@ class Recipe(models.Model):
                 MIN_VALUE,
                 message=f'Не может быть меньше {MIN_VALUE}.'
             ),
+            MaxValueValidator(
+                MAX_VALUE,
+                message=f'Не может быть больше {MAX_VALUE}.'
+            ),
         ],
     )
     author = models.ForeignKey(
@@ -116,6 +129,12 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -152,7 +171,6 @@ class RecipeIngredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент рецепта'
         verbose_name_plural = 'Ингредиенты рецептов'
-        ordering = ('recipe',)
         constraints = [
             models.UniqueConstraint(
                 fields=(
@@ -166,6 +184,20 @@ class RecipeIngredient(models.Model):
     def __str__(self):
         return f'{self.amount} {self.ingredient}'
 
+    @classmethod
+    def bulk_attach(cls, recipe, items):
+        """
+        Добавляет ингредиенты рецепту пакетной вставкой.
+        items — пары (ingredient_id, amount).
+        """
+        return cls.objects.bulk_create(
+            [
+                cls(recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+                for ingredient_id, amount in items
+            ],
+            batch_size=BULK_CREATE_BATCH_SIZE
+        )
+
 
 class ShoppingCart(models.Model):
     """Модель списка покупок."""
@@ -184,7 +216,6 @@ class ShoppingCart(models.Model):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
         default_related_name = 'shopping_cart'
-        ordering = ('recipe',)
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'recipe'],
@@ -213,7 +244,6 @@ class Favorite(models.Model):
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
         default_related_name = 'favorites'
-        ordering = ('recipe',)
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'recipe'],
@@ -243,7 +273,12 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка на автора'
         verbose_name_plural = 'Подписки на авторов'
-        ordering = ('author',)
+        indexes = [
+            models.Index(
+                fields=('user', 'author'),
+                name='follow_user_author_idx',
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=('author', 'user'),
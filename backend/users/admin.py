@@ -7,6 +7,7 @@ class UserAdmin(admin.ModelAdmin):
     """Администратор пользовательской модели пользователя."""
     list_display = ('username', 'email', 'first_name', 'last_name')
     list_filter = ('email', 'username',)
+    search_fields = ('username', 'email',)
 
 
 admin.site.register(User, UserAdmin)